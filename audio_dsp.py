@@ -0,0 +1,57 @@
+"""
+Per-block audio helpers for the capture callback.
+
+The sample loops are compiled with Numba when it is installed
+(pip install numba); otherwise equivalent numpy expressions are used.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+HAVE_NUMBA = njit is not None
+
+
+if HAVE_NUMBA:
+
+    @njit(cache=True, fastmath=True)
+    def decimate(samples, factor):
+        """Average each group of `factor` int16 samples into one"""
+        n = len(samples) // factor
+        out = np.empty(n, dtype=np.int16)
+        for i in range(n):
+            acc = 0
+            for j in range(factor):
+                acc += samples[i * factor + j]
+            out[i] = acc // factor
+        return out
+
+    @njit(cache=True, fastmath=True)
+    def rms(samples):
+        """Root-mean-square level of an int16 block"""
+        acc = 0.0
+        for i in range(len(samples)):
+            acc += float(samples[i]) * samples[i]
+        return np.sqrt(acc / len(samples))
+
+else:
+
+    def decimate(samples, factor):
+        """Average each group of `factor` int16 samples into one"""
+        samples = samples[: len(samples) - len(samples) % factor]
+        return samples.reshape(-1, factor).mean(axis=1).astype(np.int16)
+
+    def rms(samples):
+        """Root-mean-square level of an int16 block"""
+        return float(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
+
+
+def warm():
+    """Compile the kernels up front so the first ALT press doesn't wait on Numba"""
+    if HAVE_NUMBA:
+        block = np.zeros(6, dtype=np.int16)
+        decimate(block, 3)
+        rms(block)
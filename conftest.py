@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make deepgram_stt_v5 importable however pytest is invoked
+sys.path.insert(0, os.path.dirname(__file__))
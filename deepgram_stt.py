@@ -5,21 +5,24 @@ Toggle with ALT key - Green indicates listening, Red indicates idle
 """
 
 import tkinter as tk
-from tkinter import scrolledtext
 import threading
 import queue
-import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
 import sys
-import sounddevice as sd
-import numpy as np
 from datetime import datetime
 from pynput import keyboard
 from dotenv import load_dotenv
-import base64
 import time
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Load environment variables
 load_dotenv()
 
@@ -32,13 +35,42 @@ if not DEEPGRAM_API_KEY:
 
 # Import Deepgram SDK
 try:
-    from deepgram import DeepgramClient, LiveTranscriptionEvents, LiveOptions, Microphone
+    from deepgram import DeepgramClient, LiveTranscriptionEvents, LiveOptions
     print("Deepgram SDK imported successfully")
 except ImportError:
     print("Error: Deepgram SDK not installed")
     print("Please run: pip install -r requirements.txt")
     sys.exit(1)
 
+# Audio stack, imported on the first ALT press (PortAudio init is slow)
+sd = None
+np = None
+
+
+def _import_audio():
+    """Import sounddevice and numpy on first use"""
+    global sd, np
+    if sd is None:
+        import numpy as np
+        import sounddevice as sd
+
+
+# Audio format streamed to Deepgram
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 320  # 20ms of 16kHz mono int16
+
+# Deepgram closes sockets that see no traffic for ~10s
+KEEPALIVE_MSG = json.dumps({"type": "KeepAlive"})
+KEEPALIVE_INTERVAL_MS = 8000
+
+# Duplicate-final suppression: remember this many recent finals and
+# drop exact repeats seen within the window
+RECENT_FINALS_SIZE = 64
+REPEAT_WINDOW_S = 10.0
+
+# Output window history limit
+MAX_OUTPUT_LINES = 2000
+
 class STTIndicator:
     def __init__(self):
         self.root = tk.Tk()
@@ -81,16 +113,57 @@ class STTIndicator:
                                      bg='#2b2b2b', fg='white')
         self.status_label.pack()
 
+        # Console echo of transcripts/diagnostics (STT_VERBOSE=1)
+        self._verbose = os.environ.get("STT_VERBOSE") == "1"
+
         # State variables
         self.is_listening = False
         self.is_recording = False
         self.deepgram_client = None
         self.deepgram_connection = None
-        self.microphone = None
+
+        # Audio capture: the PortAudio callback assembles 20ms frames in a
+        # preallocated ring buffer and queues them for the sender thread.
+        # The send queue holds at most ~30s of audio; when the socket
+        # stalls the oldest frames are dropped.
+        self._stream = None
+        self._ring = None
+        self._write_idx = 0
+        self._read_idx = 0
+        self._send_q = collections.deque(maxlen=int(SAMPLE_RATE * 2 * 30 / (FRAME_SAMPLES * 2)))
+        self._dropped_frames = 0
+        self._buf_pool = collections.deque(bytearray(FRAME_SAMPLES * 2) for _ in range(8))
+        self._audio_evt = threading.Event()
+        self._sender_thread = None
+
+        # Transcript filtering state
+        self._last_interim = ""
+        self._interim_scheduled = False
+        self._recent_finals = collections.OrderedDict()
 
         # Output window
         self.output_window = None
         self.text_area = None
+        self._interim_shown = False
+        self._insert_counter = 0
+        self._pending = []
+        self._flush_scheduled = False
+
+        # Cached timestamp string, refreshed once per second
+        self._ts_sec = 0
+        self._ts_str = ""
+
+        # Shared worker pool for the short jobs kept off the Tk thread:
+        # transcript file writes, keepalives and saves. The audio sender
+        # runs for a whole session, so it gets its own thread instead
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="stt")
+
+        # Transcripts are appended to one open fd; at most one write task
+        # is in flight so batches land in order
+        self._log_fd = os.open("transcriptions.txt", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._write_lock = threading.Lock()
+        self._write_buf = []
+        self._write_future = None
 
         # Create menu
         self._create_menu()
@@ -125,6 +198,8 @@ class STTIndicator:
 
     def _create_output_window(self):
         """Create transcription output window"""
+        from tkinter import scrolledtext
+
         self.output_window = tk.Toplevel(self.root)
         self.output_window.title("Transcription Output")
         self.output_window.geometry("700x500")
@@ -140,6 +215,8 @@ class STTIndicator:
             insertbackground='white'
         )
         self.text_area.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.text_area.tag_configure("interim", foreground="#808080")
+        self._interim_shown = False
 
         # Button frame
         btn_frame = tk.Frame(self.output_window, bg='#1e1e1e')
@@ -171,6 +248,7 @@ class STTIndicator:
         """Clear transcription output"""
         if self.text_area:
             self.text_area.delete(1.0, tk.END)
+            self._interim_shown = False
 
     def _save_output(self):
         """Save transcription output to file"""
@@ -181,10 +259,18 @@ class STTIndicator:
         filename = f"transcription_{timestamp}.txt"
 
         content = self.text_area.get(1.0, tk.END)
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(content)
+        self._pool.submit(self._write_output_file, filename, content)
 
-        self._add_transcription(f"\n[Transcription saved to {filename}]")
+    def _write_output_file(self, filename, content):
+        """Write saved output to disk (worker thread)"""
+        try:
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(content)
+        except Exception as e:
+            print(f"Error saving output: {e}")
+            return
+
+        self.root.after(0, self._add_transcription, f"\n[Transcription saved to {filename}]")
 
     def _on_drag_start(self, event):
         """Start dragging window"""
@@ -213,27 +299,169 @@ class STTIndicator:
             print(f"Error initializing Deepgram client: {e}")
             sys.exit(1)
 
+        # Streaming options are fixed for the app's lifetime; build them once
+        self._live_options = LiveOptions(
+            model="nova-2",
+            language="en-US",
+            punctuate=True,
+            interim_results=True,
+            encoding="linear16",
+            channels=1,
+            sample_rate=SAMPLE_RATE,
+            endpointing=300,
+            vad_events=True
+        )
+
+        # Open the streaming connection once and keep it alive while idle,
+        # so ALT only has to start/stop the microphone
+        self._connect_deepgram()
+        self._keepalive_job = self.root.after(KEEPALIVE_INTERVAL_MS, self._send_keepalive)
+
+    def _connect_deepgram(self):
+        """Open the persistent Deepgram streaming connection"""
+        try:
+            # Create Deepgram connection (threaded client: socket IO runs on
+            # its own thread instead of sharing an asyncio loop)
+            connection = self.deepgram_client.listen.live.v("1")
+
+            # Register event handlers
+            connection.on(LiveTranscriptionEvents.Transcript, self._on_transcript)
+            connection.on(LiveTranscriptionEvents.Error, self._on_error)
+            connection.on(LiveTranscriptionEvents.Close, self._on_close)
+
+            # Start connection
+            if connection.start(self._live_options) is False:
+                raise Exception("Failed to connect to Deepgram")
+
+            self.deepgram_connection = connection
+            print("Connected to Deepgram")
+
+        except Exception as e:
+            print(f"Error connecting to Deepgram: {e}")
+            self.deepgram_connection = None
+
+    def _send_keepalive(self):
+        """Send a KeepAlive frame every interval while the microphone is idle"""
+        if not self.is_listening:
+            self._pool.submit(self._keepalive_now)
+        self._keepalive_job = self.root.after(KEEPALIVE_INTERVAL_MS, self._send_keepalive)
+
+    def _keepalive_now(self):
+        """Send one KeepAlive frame (worker thread)"""
+        connection = self.deepgram_connection
+        if not connection:
+            return
+        try:
+            connection.send(KEEPALIVE_MSG)
+        except Exception as e:
+            print(f"Error sending keepalive: {e}")
+
     def _on_transcript(self, self_ref, result, **kwargs):
         """Handle incoming transcript from Deepgram"""
         try:
-            data = json.loads(result)
-            if data.get("channel"):
+            # The SDK usually hands us an already-parsed response object;
+            # only fall back to JSON decoding for raw payloads
+            if not isinstance(result, (bytes, str, bytearray)):
+                data = result.to_dict() if hasattr(result, "to_dict") else result
+            else:
+                data = _json_loads(result)
+
+            try:
                 transcript = data["channel"]["alternatives"][0]["transcript"]
-                if transcript and transcript.strip():
-                    self.root.after(0, self._add_transcription, transcript)
+            except (KeyError, IndexError, TypeError):
+                return
+
+            if not transcript or not transcript.strip():
+                return
+
+            is_final = data.get("is_final", False)
+            speech_final = data.get("speech_final", False)
+
+            if not is_final and transcript == self._last_interim:
+                return
+
+            if is_final or speech_final:
+                if self._is_repeat(transcript):
+                    self._last_interim = ""
+                    return
+
+                # Only finalized text crosses into the output window
+                self._last_interim = ""
+                self.root.after(0, self._add_transcription, transcript)
+            else:
+                self._last_interim = transcript
+
+            # Interim previews are throttled to one label update per 100ms
+            if not self._interim_scheduled:
+                self._interim_scheduled = True
+                self.root.after(100, self._show_interim)
         except Exception as e:
-            print(f"Error processing transcript: {e}")
+            if self._verbose:
+                print(f"Error processing transcript: {e}")
+
+    def _is_repeat(self, transcript):
+        """Check a final transcript against recently emitted ones"""
+        key = transcript.strip().lower()
+        now = time.monotonic()
+        seen = self._recent_finals.get(key)
+
+        self._recent_finals[key] = now
+        self._recent_finals.move_to_end(key)
+        if len(self._recent_finals) > RECENT_FINALS_SIZE:
+            self._recent_finals.popitem(last=False)
+
+        # Only suppress near-immediate repeats; saying the same phrase
+        # again later is legitimate
+        return seen is not None and now - seen < REPEAT_WINDOW_S
+
+    def _show_interim(self):
+        """Show the latest interim transcript in the status label and output window"""
+        self._interim_scheduled = False
+        if not self.is_listening:
+            return
+        if self._last_interim:
+            self.status_label.config(text=self._last_interim[-10:])
+        else:
+            self.status_label.config(text="Listening")
+        self._set_interim_line(self._last_interim)
+
+    def _set_interim_line(self, text):
+        """Replace the interim line at the end of the output window in place"""
+        if not (self.text_area and self.text_area.winfo_exists()):
+            return
+
+        if self._interim_shown:
+            self.text_area.delete("interim_start", "end-1c")
+        elif text:
+            # Left gravity keeps the mark at the start of the interim line
+            self.text_area.mark_set("interim_start", "end-1c")
+            self.text_area.mark_gravity("interim_start", tk.LEFT)
+            self._interim_shown = True
+
+        if text:
+            self.text_area.insert("interim_start", text + "\n", "interim")
+            self.text_area.see(tk.END)
+        elif self._interim_shown:
+            self.text_area.mark_unset("interim_start")
+            self._interim_shown = False
 
     def _on_error(self, self_ref, error, **kwargs):
         """Handle errors from Deepgram"""
         print(f"Deepgram error: {error}")
 
-    def _toggle_listening(self):
-        """Toggle listening state"""
-        if not self.is_listening:
-            self._start_listening()
-        else:
-            _stop_listening()
+    def _on_close(self, self_ref, close=None, **kwargs):
+        """Drop the closed connection so the next ALT press reconnects"""
+        print("Deepgram connection closed")
+        self.deepgram_connection = None
+
+    def _connection_alive(self):
+        """Whether the persistent connection exists and its socket is still open"""
+        connection = self.deepgram_connection
+        if not connection:
+            return False
+        # is_connected() arrived in later 3.x SDKs; without it rely on Close
+        is_connected = getattr(connection, "is_connected", None)
+        return is_connected is None or is_connected()
 
     def _start_listening(self):
         """Start listening/transcribing"""
@@ -243,31 +471,15 @@ class STTIndicator:
             self.status_circle.itemconfig(self.indicator, fill="#44ff44")
             self.status_label.config(text="Listening")
 
-            # Create Deepgram connection
-            self.deepgram_connection = self.deepgram_client.listen.asynclive.v("1")
-
-            # Register event handlers
-            self.deepgram_connection.on(LiveTranscriptionEvents.Transcript, self._on_transcript)
-            self.deepgram_connection.on(LiveTranscriptionEvents.Error, self._on_error)
-
-            # Configure options
-            options = LiveOptions(
-                model="nova-2",
-                language="en-US",
-                punctuate=True,
-                interim_results=True,
-                encoding="linear16",
-                channels=1,
-                sample_rate=16000
-            )
-
-            # Start connection
-            if self.deepgram_connection.start(options) is False:
-                raise Exception("Failed to connect to Deepgram")
+            # Reconnect if the persistent connection was never established
+            # or has since closed (server timeout, network drop)
+            if not self._connection_alive():
+                self._connect_deepgram()
+                if not self.deepgram_connection:
+                    raise Exception("Failed to connect to Deepgram")
 
             # Start microphone
-            self.microphone = Microphone(self.deepgram_connection.send)
-            self.microphone.start()
+            self._start_audio()
 
             print("Started listening...")
 
@@ -279,44 +491,235 @@ class STTIndicator:
         """Stop listening/transcribing"""
         try:
             # Stop microphone
-            if self.microphone:
-                self.microphone.finish()
-                self.microphone = None
+            self.is_listening = False
+            self._stop_audio()
 
-            # Close Deepgram connection
-            if self.deepgram_connection:
-                self.deepgram_connection.finish()
-                self.deepgram_connection = None
+            # Keep the connection open for the next ALT press
+            self._pool.submit(self._keepalive_now)
+            self._last_interim = ""
+            self._set_interim_line("")
 
             # Update UI
-            self.is_listening = False
             self.status_circle.itemconfig(self.indicator, fill="#ff4444")
             self.status_label.config(text="Idle")
 
+            if self._dropped_frames:
+                print(f"Dropped {self._dropped_frames} audio frames while the connection was stalled")
+                self._dropped_frames = 0
+
             print("Stopped listening...")
 
         except Exception as e:
             print(f"Error stopping transcription: {e}")
 
-    def _add_transcription(self, text):
-        """Add transcription to output window"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_text = f"[{timestamp}] {text}\n"
+    def _start_audio(self):
+        """Open the input stream and start the sender thread"""
+        _import_audio()
+        if self._ring is None:
+            self._ring = np.empty(SAMPLE_RATE * 2, dtype=np.int16)
+
+        self._read_idx = self._write_idx
+        self._send_q.clear()
+        self._audio_evt.clear()
+
+        # Capture at the device's native rate and convert to 16kHz ourselves
+        device_info = sd.query_devices(kind="input")
+        self._capture_rate = int(device_info["default_samplerate"])
+        blocksize = self._capture_rate * FRAME_SAMPLES // SAMPLE_RATE
+
+        # Precompute sample positions for non-integer resampling ratios
+        self._resample_xp = np.arange(blocksize)
+        self._resample_x = np.linspace(0, blocksize - 1, FRAME_SAMPLES)
+
+        self._stream = sd.RawInputStream(
+            samplerate=self._capture_rate,
+            blocksize=blocksize,
+            dtype="float32",
+            channels=1,
+            callback=self._audio_callback
+        )
+        self._stream.start()
+
+        self._sender_thread = threading.Thread(
+            target=self._send_audio, name="stt-sender", daemon=True
+        )
+        self._sender_thread.start()
+
+    def _stop_audio(self):
+        """Close the input stream and wait for the sender thread"""
+        if self._stream:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+        if self._sender_thread:
+            self._audio_evt.set()
+            self._sender_thread.join(timeout=1.0)
+            self._sender_thread = None
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        """Queue captured audio as 20ms frames (PortAudio thread)"""
+        samples = self._to_linear16(np.frombuffer(indata, dtype=np.float32))
+        size = len(self._ring)
+        start = self._write_idx % size
+        end = start + len(samples)
+
+        if end <= size:
+            self._ring[start:end] = samples
+        else:
+            split = size - start
+            self._ring[start:] = samples[:split]
+            self._ring[:end - size] = samples[split:]
+
+        self._write_idx += len(samples)
+
+        # Hand every complete frame to the sender, copied into a pooled
+        # buffer so steady-state capture allocates nothing per frame
+        while self._write_idx - self._read_idx >= FRAME_SAMPLES:
+            frame = self._buf_pool.popleft() if self._buf_pool else bytearray(FRAME_SAMPLES * 2)
+            out = np.frombuffer(frame, dtype=np.int16)
+
+            start = self._read_idx % size
+            end = start + FRAME_SAMPLES
+            if end <= size:
+                out[:] = self._ring[start:end]
+            else:
+                split = size - start
+                out[:split] = self._ring[start:]
+                out[split:] = self._ring[:end - size]
+            self._read_idx += FRAME_SAMPLES
+
+            if len(self._send_q) == self._send_q.maxlen:
+                self._dropped_frames += 1
+            self._send_q.append(frame)
+
+        self._audio_evt.set()
+
+    def _to_linear16(self, samples):
+        """Resample float32 mono audio to 16kHz and quantize to int16"""
+        rate = self._capture_rate
+        if rate % SAMPLE_RATE == 0:
+            # Integer ratio (16/32/48kHz): average each group of samples,
+            # a cheap low-pass filter plus decimation in one pass
+            factor = rate // SAMPLE_RATE
+            if factor > 1:
+                usable = len(samples) - len(samples) % factor
+                samples = samples[:usable].reshape(-1, factor).mean(axis=1)
+        elif len(samples) == len(self._resample_xp):
+            samples = np.interp(self._resample_x, self._resample_xp, samples)
+        else:
+            n_out = len(samples) * SAMPLE_RATE // rate
+            samples = np.interp(
+                np.linspace(0, len(samples) - 1, n_out), np.arange(len(samples)), samples
+            )
+
+        return np.clip(samples * 32767, -32768, 32767).astype(np.int16)
+
+    def _send_audio(self):
+        """Send queued 20ms frames to Deepgram"""
+        while self.is_listening:
+            if not self._audio_evt.wait(timeout=0.1):
+                continue
+            self._audio_evt.clear()
+
+            while self.is_listening and self._send_q:
+                frame = self._send_q.popleft()
+                try:
+                    self.deepgram_connection.send(frame)
+                except Exception as e:
+                    print(f"Error sending audio: {e}")
 
-        print(formatted_text, end='')
+                # send() has written the frame to the socket; recycle it
+                self._buf_pool.append(frame)
+
+    def _add_transcription(self, text):
+        """Queue transcription for the output window and transcript file"""
+        formatted_text = f"[{self._stamp()}] {text}\n"
+
+        # Echo to the console only when asked to (stdout may be missing in GUI mode)
+        if self._verbose and sys.__stdout__ is not None:
+            sys.__stdout__.write(formatted_text)
+
+        # Coalesce everything that arrives before Tk goes idle into one insert
+        self._pending.append(formatted_text)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.root.after_idle(self._flush_pending)
+
+    def _flush_pending(self):
+        """Write pending transcriptions to the output window and file"""
+        pending, self._pending = self._pending, []
+        self._flush_scheduled = False
+        if not pending:
+            return
+        text = "".join(pending)
 
         if self.text_area and self.text_area.winfo_exists():
-            self.text_area.insert(tk.END, formatted_text)
+            # Finalized text replaces the interim preview line
+            self._set_interim_line("")
+            self.text_area.insert(tk.END, text)
+
+            # Trim old history so the widget stays bounded (checked every 32 inserts)
+            self._insert_counter += 1
+            if self._insert_counter % 32 == 0:
+                line_count = int(self.text_area.index("end-1c").split(".")[0])
+                if line_count > MAX_OUTPUT_LINES:
+                    self.text_area.delete("1.0", f"{line_count - MAX_OUTPUT_LINES + 1}.0")
+
             self.text_area.see(tk.END)
 
-            # Auto-save to file
-            with open("transcriptions.txt", "a", encoding="utf-8") as f:
-                f.write(formatted_text)
+        # Auto-save to file
+        with self._write_lock:
+            self._write_buf.append(text)
+            if self._write_future:
+                return
+            self._write_future = self._pool.submit(self._write_pending)
+
+    def _stamp(self):
+        """Return the current local time, formatted once per second"""
+        t = int(time.time())
+        if t != self._ts_sec:
+            self._ts_sec = t
+            self._ts_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+        return self._ts_str
+
+    def _write_pending(self):
+        """Append buffered transcriptions to transcriptions.txt (worker thread)"""
+        while True:
+            with self._write_lock:
+                batch, self._write_buf = self._write_buf, []
+                if not batch:
+                    self._write_future = None
+                    return
+
+            # One writev() per batch on the already-open descriptor
+            try:
+                os.writev(self._log_fd, [text.encode("utf-8") for text in batch])
+            except Exception as e:
+                print(f"Error saving to file: {e}")
 
     def _on_closing(self):
         """Handle window closing"""
         self._stop_listening()
         self.running = False
+
+        # Close Deepgram connection
+        self.root.after_cancel(self._keepalive_job)
+        if self.deepgram_connection:
+            try:
+                self.deepgram_connection.finish()
+            except Exception as e:
+                print(f"Error closing Deepgram connection: {e}")
+            self.deepgram_connection = None
+
+        # Flush pending transcriptions before exiting
+        self._flush_pending()
+        # Let a running write finish (the jobs are short) so the inline
+        # drain below can't interleave with it or lose the fd under it
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._write_pending()
+        os.close(self._log_fd)
+
         self.root.destroy()
 
     def run(self):
@@ -326,7 +729,10 @@ class STTIndicator:
         print("Right-click the indicator for options")
         print("Window is draggable")
 
-        # Start keyboard listener
+        # Start keyboard listener. Keys are canonicalized (alt_l/alt_r ->
+        # alt) and fed to a HotKey, which fires once per ALT press and
+        # ignores auto-repeat while the key is held
+        self._alt_hotkey = keyboard.HotKey(keyboard.HotKey.parse("<alt>"), self._on_alt_pressed)
         self.keyboard_listener = keyboard.Listener(
             on_press=self._on_key_press,
             on_release=self._on_key_release
@@ -337,15 +743,19 @@ class STTIndicator:
 
     def _on_key_press(self, key):
         """Handle key press events"""
-        if key == keyboard.Key.alt:
-            if not self.is_listening:
-                self.root.after(0, self._start_listening)
+        self._alt_hotkey.press(self.keyboard_listener.canonical(key))
 
     def _on_key_release(self, key):
         """Handle key release events"""
-        if key == keyboard.Key.alt:
-            if self.is_listening:
-                self.root.after(0, self._stop_listening)
+        key = self.keyboard_listener.canonical(key)
+        self._alt_hotkey.release(key)
+        if key == keyboard.Key.alt and self.is_listening:
+            self.root.after(0, self._stop_listening)
+
+    def _on_alt_pressed(self):
+        """Start listening when ALT goes down"""
+        if not self.is_listening:
+            self.root.after(0, self._start_listening)
 
 if __name__ == "__main__":
     app = STTIndicator()
@@ -8,17 +8,26 @@ import tkinter as tk
 from tkinter import scrolledtext
 import threading
 import queue
+import collections
+import contextlib
+import functools
 import json
+import logging
 import re
 import os
 import sys
 import subprocess
+import shutil
 import sounddevice as sd
 import numpy as np
 from datetime import datetime
 from pynput import keyboard
 from dotenv import load_dotenv
+from websockets.exceptions import ConnectionClosed
 import time
+from typing import NamedTuple
+
+import audio_dsp
 
 # Load environment variables
 load_dotenv()
@@ -40,10 +49,162 @@ except ImportError as e:
     print("Please run: pip install -r requirements.txt")
     sys.exit(1)
 
+# Per-block and per-event debug output goes through logging and is dropped
+# unless LOG_LEVEL is set (e.g. LOG_LEVEL=DEBUG), so the audio callback and
+# receive loop never block on stdout; warnings and errors always show
+_log = logging.getLogger("deepgram_stt")
+if os.getenv("LOG_LEVEL"):
+    _level = logging.getLevelName(os.getenv("LOG_LEVEL").upper())
+    logging.basicConfig(
+        level=_level if isinstance(_level, int) else logging.WARNING,
+        format="%(threadName)s: %(message)s",
+    )
+    if not isinstance(_level, int):
+        _log.warning("Unknown LOG_LEVEL %r, using WARNING", os.getenv("LOG_LEVEL"))
+
+# Deepgram's speech models are tuned for 16kHz; sending more is wasted upload
+SAMPLE_RATE = 16000
+
+# Energy gate: a 100ms block counts as speech when its RMS exceeds the noise
+# floor by VAD_RATIO; the next VAD_HANGOVER_BLOCKS are sent anyway so word
+# endings aren't cut and Deepgram hears enough trailing silence to end the
+# utterance (utterance_end_ms), and VAD_PREROLL_BLOCKS before an onset are
+# sent too
+VAD_RATIO = 3.0
+VAD_MIN_FLOOR = 100.0
+VAD_HANGOVER_BLOCKS = 12
+VAD_PREROLL_BLOCKS = 2
+
+# Deepgram closes a socket that receives no data for 10s
+KEEPALIVE_INTERVAL_S = 3.0
+
+# Longer text is pasted through the clipboard (xclip + Ctrl+V) rather than
+# typed one key event at a time
+PASTE_MIN_CHARS = 20
+
+# The output window keeps only the most recent lines; the full history is
+# in transcriptions.txt
+MAX_OUTPUT_LINES = 500
+
+# Optional in-process typing via libxdo (pip install python-libxdo).
+# Without it we fall back to spawning the xdotool binary.
+try:
+    from xdo import Xdo, charcodemap_t
+except ImportError:
+    Xdo = None
+
+@functools.lru_cache(maxsize=1)
+def _have_xdotool():
+    """Whether xdotool is on PATH; looked up once per process"""
+    return shutil.which("xdotool") is not None
+
+
+# xdotool can't reach native Wayland windows; ydotool (uinput) can. It takes
+# evdev key codes rather than keysyms, so only the keys we send are mapped.
+_YDOTOOL_KEYCODES = {"Return": (28,), "ctrl+v": (29, 47)}
+# Key-up for both ALT keys, sent ahead of every ydotool job. ydotool can't
+# read the keyboard state, so unlike xdotool's --clearmodifiers the keys
+# aren't pressed again afterwards.
+_YDOTOOL_ALT_UP = ("56:0", "100:0")
+
+
+@functools.lru_cache(maxsize=1)
+def _have_ydotool():
+    """Whether this is a Wayland session with ydotool on PATH; looked up once"""
+    return (
+        os.environ.get("XDG_SESSION_TYPE") == "wayland"
+        and shutil.which("ydotool") is not None
+    )
+
+
+# argv for the most common keystroke, a single Enter; shared, never rebuilt
+_XDOTOOL_ENTER_ARGV = ("xdotool", "key", "--clearmodifiers", "Return")
+
+
+def _close_code(exc):
+    """Close code the server sent with a ConnectionClosed, or None"""
+    return exc.rcvd.code if exc.rcvd is not None else None
+
+
+# A voice command is a whole punctuation-delimited segment: it starts at the
+# beginning of the transcript or right after punctuation, and ends at
+# punctuation (which is swallowed) or the end of the transcript, so "enter"
+# inside a sentence is typed as a word
+_CMD_RE = re.compile(
+    r"(?:^|(?<=[.?!,;]))\s*"
+    r"(?P<cmd>(?:type|press)\s+enter|enter\s+key|new\s+line|next\s+line"
+    r"|enters?(?:\s+enters?)*)"
+    r"\s*(?:[.?!,;]+|$)",
+    re.IGNORECASE,
+)
+
+# Command lexicon: a command _CMD_RE matches is either one of the two-word
+# phrases (one Enter) or a run of the single words (one Enter each)
+_ENTER_UNIGRAMS = frozenset({"enter", "enters"})
+_ENTER_BIGRAMS = frozenset(
+    {
+        ("type", "enter"),
+        ("press", "enter"),
+        ("new", "line"),
+        ("next", "line"),
+        ("enter", "key"),
+    }
+)
+
+# Every command contains one of these words; a transcript without any of
+# them is plain text and skips the regex scan
+_CMD_TRIGGERS = _ENTER_UNIGRAMS | {"line"}
+# Punctuation becomes a space, so "Hello.Enter." still yields "enter"
+_STRIP_PUNCT = str.maketrans(".?!,;", "     ")
+
+
+class _Cmd(NamedTuple):
+    """One step of a parsed transcript"""
+
+    kind: str  # "text" or "enter"
+    payload: object  # the text to type, or how many times to press Enter
+
+
+def _parse_transcript(transcript):
+    """Split a transcript into the _Cmd steps to carry out, in order"""
+    # Normalise the whole transcript once (casefold, punctuation to spaces);
+    # the original text is what gets typed and shown
+    words = transcript.casefold().translate(_STRIP_PUNCT).split()
+    if _CMD_TRIGGERS.isdisjoint(words):
+        return [_Cmd("text", transcript)] if words else []
+
+    # One re.split pass cuts the transcript into alternating text and
+    # command parts (the cmd group is kept): [text, cmd, text, ..., text].
+    # Text is kept verbatim (including its punctuation); adjacent
+    # commands ("Enter. Enter.") become one run.
+    cmds = []
+    enters = 0
+    for i, part in enumerate(_CMD_RE.split(transcript)):
+        if i % 2:
+            words = tuple(part.casefold().split())
+            if words in _ENTER_BIGRAMS:
+                enters += 1
+            else:
+                # "enter", or a run like "enter enter"
+                enters += len(words)
+        elif part.strip():
+            if enters:
+                cmds.append(_Cmd("enter", enters))
+                enters = 0
+            cmds.append(_Cmd("text", part))
+    if enters:
+        cmds.append(_Cmd("enter", enters))
+    return cmds
+
 
 class STTIndicator:
+    # Every external process (xdotool, xclip) is started through here
+    _run = staticmethod(subprocess.run)
+
     def __init__(self):
         self.root = tk.Tk()
+        # Callbacks for the Tk thread are scheduled through here
+        self._schedule = self.root.after
         self.root.title("STT")
         self.root.geometry("160x100+100+100")
 
@@ -99,19 +260,65 @@ class STTIndicator:
         # State variables
         self.is_listening = False
         self.is_recording = False
-        self.is_typing = False  # Flag to prevent Alt key interference
+        self._typing_evt = threading.Event()  # Set while typing, to prevent Alt key interference
         self.alt_held = False  # Flag to prevent auto-repeat toggling
         self.last_toggle_time = 0  # Debounce timer
         self.deepgram_client = None
-        self.audio_queue = queue.Queue()
         self.running = True
 
         # Output window
         self.output_window = None
         self.text_area = None
+        self._line_fmt = "[{:%Y-%m-%d %H:%M:%S}] {}\n".format
 
-        # Typing method: use xdotool (most reliable for X11)
+        # Typing method: libxdo in-process if available, else ydotool on
+        # Wayland, else the xdotool binary
+        self._xdo = self._open_xdo()
+        self.ydotool_available = not self._xdo and self._check_ydotool()
         self.xdotool_available = self._check_xdotool()
+        self.xclip_available = shutil.which("xclip") is not None
+
+        # All typing and key commands run in order on one worker thread so
+        # the receive thread never blocks on X
+        self._type_q = queue.Queue()
+        self._typer_thread = threading.Thread(target=self._typer_loop, daemon=True)
+        self._typer_thread.start()
+
+        # Transcript lines are appended to transcriptions.txt by a writer
+        # thread holding one open handle; None tells it to finish
+        self._log_q = queue.SimpleQueue()
+        self._log_thread = threading.Thread(target=self._log_worker, daemon=True)
+        self._log_thread.start()
+
+        # Final transcripts of the current utterance, typed when it ends
+        self._pending_type = []
+        self._pending_lock = threading.Lock()
+        self._type_flush_scheduled = False
+        self._interim_text = ""
+
+        # Where Results events keep their alternatives; see _on_transcript_event
+        self._alternatives = self._channel_alternatives
+
+        # The input device, audio stream and Deepgram socket outlive a single
+        # listening session; stopping only stops forwarding audio
+        self._input_device = None
+        self._samplerate = None
+        self._capture_rate = None
+        self._session_stop = threading.Event()
+        self.recording_thread = None
+        self._dg_socket = None
+
+        # The callback only queues audio; a sender thread does the network
+        # I/O so a stalled socket can't block the audio thread. Keeps at most
+        # ~30s, dropping the oldest blocks. None asks Deepgram to finalize.
+        self._send_q = collections.deque(maxlen=300)
+        self._audio_ready = threading.Event()
+        self._last_send = 0.0
+
+        # Silent blocks aren't sent; see _is_voiced
+        self._noise_floor = VAD_MIN_FLOOR
+        self._hangover = 0
+        self._preroll = collections.deque(maxlen=VAD_PREROLL_BLOCKS)
 
         # Bind right-click to toggle listening (no menu)
         self.root.bind("<Button-3>", self._toggle_listening_click)
@@ -120,11 +327,32 @@ class STTIndicator:
         # Set close handler
         self.root.protocol("WM_DELETE_WINDOW", self._on_closing)
 
-        # Initialize Deepgram client
-        self._init_deepgram()
-
-        # Start audio processing thread
-        self._start_audio_thread()
+        # ALT events from the keyboard listener thread, handled on the Tk
+        # thread by _drain_events. The listener never calls into Tk: it
+        # writes a byte to a pipe that Tk watches, so the idle app doesn't
+        # poll and a busy Tk thread never stalls the keyboard hook
+        self._evq = queue.Queue()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self.root.tk.createfilehandler(self._wake_r, tk.READABLE, self._drain_events)
+
+        # Deepgram client, device query and Numba warm-up happen in the
+        # background so the window shows at once; _ready_evt marks the end
+        self._ready_evt = threading.Event()
+        threading.Thread(target=self._async_init, daemon=True).start()
+
+    @property
+    def is_typing(self):
+        """True while the typing worker is injecting keystrokes"""
+        return self._typing_evt.is_set()
+
+    @is_typing.setter
+    def is_typing(self, value):
+        if value:
+            self._typing_evt.set()
+        else:
+            self._typing_evt.clear()
 
     def _toggle_listening_click(self, event):
         """Toggle listening on right-click"""
@@ -138,7 +366,7 @@ class STTIndicator:
         except:
             pass
         # Schedule next check in 100ms
-        self.root.after(100, self._keep_on_top)
+        self._schedule(100, self._keep_on_top)
 
     def _unfocus_after_click(self, event):
         """Unfocus indicator window after click - simplified approach"""
@@ -153,135 +381,160 @@ class STTIndicator:
 
     def _check_xdotool(self):
         """Check if xdotool is available"""
+        available = _have_xdotool()
+        if available:
+            print("DEBUG: xdotool found - will use for typing", flush=True)
+        else:
+            print("DEBUG: xdotool NOT found - typing will not work", flush=True)
+        return available
+
+    def _check_ydotool(self):
+        """Check if ydotool should be used (Wayland session with ydotool)"""
+        available = _have_ydotool()
+        if available:
+            print("DEBUG: Wayland session - will use ydotool for typing", flush=True)
+        return available
+
+    def _open_xdo(self):
+        """Open an in-process libxdo handle, if python-libxdo is installed"""
+        if Xdo is None:
+            return None
         try:
-            result = subprocess.run(
-                ["which", "xdotool"], capture_output=True, text=True
-            )
-            available = result.returncode == 0
-            if available:
-                print("DEBUG: xdotool found - will use for typing", flush=True)
-            else:
-                print("DEBUG: xdotool NOT found - typing will not work", flush=True)
-            return available
+            xdo = Xdo()
+            print("DEBUG: libxdo found - will type in-process", flush=True)
+            return xdo
         except Exception as e:
-            print(f"DEBUG: Error checking xdotool: {e}", flush=True)
-            return False
+            print(f"DEBUG: Could not open libxdo: {e}", flush=True)
+            return None
 
     def _run_xdotool(self, args):
-        """Run xdotool command with typing flag to prevent Alt key interference"""
-        self.is_typing = True
+        """Run an xdotool/ydotool command (fallback when libxdo is unavailable)"""
+        self._run(args, check=True)
+        # xdotool's synthetic key releases can reach our listener slightly
+        # after it exits; keep is_typing set a little longer
+        time.sleep(0.2)
+
+    def _xdotool_cmd(self, line):
+        """Run one xdotool command line such as "key Return" """
+        self._run_xdotool(["xdotool", *line.split()])
+
+    def _typer_loop(self):
+        """Execute queued typing jobs in order"""
+        while True:
+            kind, payload = self._type_q.get()
+            self.is_typing = True
+            try:
+                if kind == "key":
+                    self._send_key(*payload)
+                else:
+                    self._type_with_xdotool(payload)
+            except Exception as e:
+                print(f"DEBUG: Error executing {kind} {payload!r}: {e}", flush=True)
+            finally:
+                self.is_typing = False
+                self._type_q.task_done()
+
+    def _queue_key(self, key, count=1):
+        """Queue `count` presses of a key (e.g. Return) behind any pending typing"""
+        self._type_q.put(("key", (key, count)))
+
+    @contextlib.contextmanager
+    def _xdo_modifiers_cleared(self):
+        """Release held modifiers (e.g. ALT in press-and-hold) around a libxdo job"""
+        # python-libxdo leaves clear/set_active_modifiers unimplemented; this
+        # is what libxdo's own versions do: release the keys, press them again
+        mods = self._xdo.get_active_modifiers()
+        keys = (charcodemap_t * len(mods))(*mods)
+        if mods:
+            self._xdo.send_keysequence_window_list_do(0, keys, pressed=0, delay=0)
         try:
-            subprocess.run(args, check=True)
+            yield
         finally:
-            # Increased delay to ensure ALL key release events are processed
-            # xdotool might trigger events slightly after it returns
-            time.sleep(0.2)
-            self.is_typing = False
+            if mods:
+                self._xdo.send_keysequence_window_list_do(0, keys, pressed=1, delay=0)
+
+    def _send_key(self, key, count=1):
+        """Press a key `count` times in the active window"""
+        if self._xdo:
+            with self._xdo_modifiers_cleared():
+                for _ in range(count):
+                    # 0 = CURRENTWINDOW; returns once the events are flushed to X
+                    self._xdo.send_keysequence_window(0, key.encode("utf-8"))
+        elif self.ydotool_available:
+            codes = _YDOTOOL_KEYCODES[key]
+            strokes = [f"{c}:1" for c in codes] + [f"{c}:0" for c in codes[::-1]]
+            self._run_xdotool(["ydotool", "key", *_YDOTOOL_ALT_UP, *strokes * count])
+        elif key == "Return" and count == 1:
+            self._run_xdotool(_XDOTOOL_ENTER_ARGV)
+        elif count > 1:
+            # One xdotool process for the whole run
+            self._xdotool_cmd(f"key --clearmodifiers --repeat {count} --delay 0 {key}")
+        else:
+            # ALT may still be held (press-and-hold), which would turn
+            # ctrl+v into ctrl+alt+v
+            self._xdotool_cmd(f"key --clearmodifiers {key}")
 
     def _type_with_xdotool(self, text):
-        """Type text using xdotool (most reliable for X11)"""
-        try:
-            # Use xdotool to type the text
-            # We need to escape special characters for shell
-            safe_text = text.replace("'", "'\"'\"'")  # Escape single quotes
-            safe_text = safe_text.replace("\\", "\\\\")  # Escape backslashes
+        """Type text into the active window using libxdo, ydotool or xdotool"""
+        if len(text) > PASTE_MIN_CHARS and self._paste_text(text):
+            return
 
+        if self._xdo:
+            with self._xdo_modifiers_cleared():
+                self._xdo.enter_text_window(0, text.encode("utf-8"), delay=10000)
+        elif self.ydotool_available:
+            self._run(["ydotool", "key", *_YDOTOOL_ALT_UP], check=True)
+            self._run_xdotool(["ydotool", "type", "--key-delay", "10", text])
+        else:
+            # argv is passed straight to exec, so no shell escaping is needed
             cmd = ["xdotool", "type", "--clearmodifiers", "--delay", "10", text]
-
-            # Use internal helper to manage typing flag
             self._run_xdotool(cmd)
-            return True
 
+    def _paste_text(self, text):
+        """Paste text with one Ctrl+V via the clipboard; False if that isn't possible"""
+        if not self.xclip_available:
+            return False
+        try:
+            # xclip forks to serve the selection and returns immediately
+            self._run(
+                ["xclip", "-selection", "clipboard"],
+                input=text.encode("utf-8"),
+                check=True,
+                timeout=1,
+            )
         except Exception as e:
-            print(f"DEBUG: Error with xdotool: {e}", flush=True)
+            print(f"DEBUG: Clipboard unavailable, typing instead: {e}", flush=True)
             return False
+        self._send_key("ctrl+v")
+        return True
 
     def _process_transcript(self, transcript):
         """Process transcript, handling commands mixed with text"""
         print(f"DEBUG: Processing transcript: '{transcript}'", flush=True)
 
-        # Split by punctuation to handle sentences/segments
-        # Keep delimiters
-        parts = re.split(r"([.?!,;]+)", transcript)
-
-        text_buffer = ""
-        skip_next_sep = False
-
-        command_map = {
-            "enter": "Return",
-            "enters": "Return",
-            "enter key": "Return",
-            "type enter": "Return",
-            "press enter": "Return",
-            "new line": "Return",
-            "next line": "Return",
-        }
-
-        for i, part in enumerate(parts):
-            # If this is a separator
-            if i % 2 == 1:
-                if skip_next_sep:
-                    skip_next_sep = False
-                    continue
-                text_buffer += part
-                continue
-
-            # This is a content part
-            clean_part = part.strip().lower()
-            if not clean_part:
-                continue
-
-            # Check for explicit commands
-            if clean_part in command_map:
-                # Flush buffer if any
-                if text_buffer:
-                    print(f"DEBUG: Flushing buffer: '{text_buffer}'", flush=True)
-                    self.root.after(0, self._add_transcription, text_buffer)
-                    text_buffer = ""
-                    # Wait a bit for typing to finish
-                    time.sleep(0.1)
-
-                # Execute command
-                key = command_map[clean_part]
-                print(f"DEBUG: Executing command: {key}", flush=True)
-                try:
-                    self._run_xdotool(["xdotool", "key", key])
-                except Exception as e:
-                    print(f"DEBUG: Error executing command {key}: {e}", flush=True)
-
-                # Skip the next separator (punctuation)
-                skip_next_sep = True
-                continue
-
-            # Check for repeated "enter" (e.g. "enter enter")
-            words = clean_part.split()
-            if words and all(w in ["enter", "enters"] for w in words):
-                count = len(words)
-                # Flush buffer
-                if text_buffer:
-                    print(f"DEBUG: Flushing buffer: '{text_buffer}'", flush=True)
-                    self.root.after(0, self._add_transcription, text_buffer)
-                    text_buffer = ""
-                    time.sleep(0.1)
-
-                print(f"DEBUG: Executing Enter x{count}", flush=True)
-                try:
-                    for _ in range(count):
-                        self._run_xdotool(["xdotool", "key", "Return"])
-                        time.sleep(0.05)
-                except Exception as e:
-                    print(f"DEBUG: Error executing Enter x{count}: {e}", flush=True)
+        # Steps are queued in order, so each Enter follows the text before it
+        shown = []
+        for cmd in _parse_transcript(transcript):
+            if cmd.kind == "enter":
+                self._exec_enter(cmd.payload)
+            else:
+                print(f"DEBUG: Flushing buffer: '{cmd.payload}'", flush=True)
+                self._type_into_active_window(cmd.payload)
+                shown.append(cmd.payload)
 
-                skip_next_sep = True
-                continue
+        if shown:
+            # One Tk callback shows every text part of the transcript
+            self._schedule(0, self._add_many, shown)
 
-            # Not a command, add to buffer
-            text_buffer += part
+    def _exec_enter(self, count=1):
+        """Press Enter `count` times, after any text queued before it"""
+        print(f"DEBUG: Executing Enter x{count}", flush=True)
+        self._queue_key("Return", count)
 
-        # Flush remaining buffer
-        if text_buffer:
-            print(f"DEBUG: Flushing remaining buffer: '{text_buffer}'", flush=True)
-            self.root.after(0, self._add_transcription, text_buffer)
+    def _add_many(self, texts):
+        """Add several transcribed segments in one Tk callback"""
+        for text in texts:
+            self._add_transcription(text)
 
     def _toggle_output_window(self):
         """Toggle output window"""
@@ -372,6 +625,30 @@ class STTIndicator:
         y = self.root.winfo_y() + delta_y
         self.root.geometry(f"+{x}+{y}")
 
+    def _async_init(self):
+        """Do the slow startup work off the Tk thread"""
+        try:
+            self._init_deepgram()
+        except Exception:
+            self._ready_evt.set()
+            self._schedule(0, self._on_closing)
+            return
+
+        try:
+            self._query_input_device()
+        except Exception as e:
+            # Retried when the first session starts
+            print(f"DEBUG: Could not query input device: {e}", flush=True)
+
+        # Compile the DSP kernels before the stream opens, so the audio
+        # callback never waits on Numba's compile lock
+        try:
+            audio_dsp.warm()
+        except Exception as e:
+            print(f"DEBUG: Could not precompile audio kernels: {e}", flush=True)
+
+        self._ready_evt.set()
+
     def _init_deepgram(self):
         """Initialize Deepgram client"""
         try:
@@ -379,17 +656,7 @@ class STTIndicator:
             print("Deepgram client initialized successfully", flush=True)
         except Exception as e:
             print(f"Error initializing Deepgram client: {e}", flush=True)
-            sys.exit(1)
-
-    def _start_audio_thread(self):
-        """Start background audio processing thread"""
-        self.audio_thread = threading.Thread(target=self._audio_worker, daemon=True)
-        self.audio_thread.start()
-
-    def _audio_worker(self):
-        """Process audio from queue"""
-        while self.running:
-            time.sleep(0.1)
+            raise
 
     def _toggle_listening(self):
         """Toggle listening state"""
@@ -411,36 +678,6 @@ class STTIndicator:
         except Exception as e:
             print(f"DEBUG: Could not force focus: {e}", flush=True)
 
-    def _on_transcript_event(self, event):
-        """Handle incoming transcription event object (already parsed)"""
-        try:
-            print(f"DEBUG: Received event from Deepgram: {type(event).__name__}")
-
-            # Check if it's a results event
-            if hasattr(event, "type") and event.type == "Results":
-                # Try different attribute names
-                channel = None
-                if hasattr(event, "channel"):
-                    channel = event.channel
-                elif hasattr(event, "results") and event.results:
-                    # Event might have results structure
-                    results = event.results
-                    if hasattr(results, "channels") and results.channels:
-                        channel = results.channels[0]
-
-                if channel:
-                    alternatives = getattr(channel, "alternatives", [])
-                    if alternatives and len(alternatives) > 0:
-                        alt = alternatives[0]
-                        transcript = getattr(alt, "transcript", "")
-                        if transcript and transcript.strip():
-                            print(f"DEBUG: Transcript: {transcript}", flush=True)
-
-                            # Process transcript for mixed content (text + commands)
-                            self._process_transcript(transcript)
-        except Exception as e:
-            print(f"DEBUG: Error in _on_transcript_event: {e}", flush=True)
-
     def _start_listening(self):
         """Start listening/transcribing"""
         if self.is_listening:
@@ -452,14 +689,10 @@ class STTIndicator:
             self.is_listening = True
             self.status_circle.itemconfig(self.indicator, fill="#44ff44")
             self.status_label.config(text="Listening")
+            self._preroll.clear()
 
-            print("DEBUG: Starting audio recording thread...")
-            # Start recording thread
-            self.is_recording = True
-            self.recording_thread = threading.Thread(
-                target=self._record_audio, daemon=True
-            )
-            self.recording_thread.start()
+            # Normally already connected by run(); reconnects after a drop
+            self._ensure_connected()
 
             print("Started listening...")
 
@@ -479,45 +712,153 @@ class STTIndicator:
             self.status_circle.itemconfig(self.indicator, fill="#ff4444")
             self.status_label.config(text="Idle")
 
+            # Flush Deepgram's buffer so the tail of the utterance comes
+            # back as a final now rather than with the next session
+            if self._dg_socket is not None:
+                self._send_q.append(None)
+                self._audio_ready.set()
+
             print("Stopped listening...")
 
         except Exception as e:
             print(f"Error stopping transcription: {e}")
 
+    def _ensure_connected(self):
+        """Open the audio stream and Deepgram socket unless already open"""
+        if self.recording_thread and self.recording_thread.is_alive():
+            return
+        print("DEBUG: Starting audio recording thread...")
+        self.is_recording = True
+        self.recording_thread = threading.Thread(
+            target=self._record_audio, daemon=True
+        )
+        self.recording_thread.start()
+
+    def _query_input_device(self):
+        """Look up the default input device once and return the rate to capture at"""
+        if self._input_device is None:
+            self._input_device = sd.query_devices(kind="input")
+            self._samplerate = int(self._input_device["default_samplerate"])
+            try:
+                # Let PortAudio/ALSA do the resampling when the device allows
+                sd.check_input_settings(
+                    samplerate=SAMPLE_RATE, channels=1, dtype="int16"
+                )
+                self._capture_rate = SAMPLE_RATE
+            except Exception:
+                self._capture_rate = self._samplerate
+            print(
+                f"DEBUG: Recording from: {self._input_device['name']} "
+                f"at {self._capture_rate}Hz"
+            )
+        return self._capture_rate
+
+    def _make_resampler(self, rate):
+        """Return a function converting one int16 block at `rate` to 16kHz bytes"""
+        if rate == SAMPLE_RATE:
+            return bytes
+
+        if rate % SAMPLE_RATE == 0:
+            # Integer ratio (32/48kHz): average each group of samples, a
+            # cheap low-pass filter plus decimation in one pass
+            factor = rate // SAMPLE_RATE
+
+            def convert(block):
+                return audio_dsp.decimate(block[:, 0], factor).tobytes()
+
+            return convert
+
+        # Anything else (e.g. 44.1kHz): linear interpolation, with the
+        # sample positions computed once for the fixed block size
+        blocksize = int(rate * 0.1)
+        xp = np.arange(blocksize)
+        x = np.linspace(0, blocksize - 1, SAMPLE_RATE // 10)
+
+        def convert(block):
+            samples = block[:, 0]
+            if len(samples) == blocksize:
+                out = np.interp(x, xp, samples)
+            else:
+                n = len(samples) * SAMPLE_RATE // rate
+                out = np.interp(
+                    np.linspace(0, len(samples) - 1, n), np.arange(len(samples)), samples
+                )
+            return out.astype(np.int16).tobytes()
+
+        return convert
+
     def _record_audio(self):
-        """Record audio from microphone and transcribe"""
+        """Stream the microphone to Deepgram until the app closes or the socket drops"""
+        self._ready_evt.wait()
+        self._session_stop.clear()
         try:
-            device_info = sd.query_devices(kind="input")
-            samplerate = int(device_info["default_samplerate"])
-
-            print(f"DEBUG: Recording from: {device_info['name']} at {samplerate}Hz")
+            samplerate = self._query_input_device()
+            to_linear16 = self._make_resampler(samplerate)
 
             # Use the context manager properly for WebSocket connection
             with self.deepgram_client.listen.v1.connect(
                 model="nova-2",
                 language="en-US",
                 punctuate="true",
+                smart_format="true",
                 interim_results="true",
+                # Deepgram marks utterance ends; typing happens there
+                endpointing="300",
+                utterance_end_ms="1000",
                 encoding="linear16",
-                sample_rate=str(samplerate),
+                sample_rate=str(SAMPLE_RATE),
                 channels="1",
             ) as socket:
                 print("DEBUG: Connected to Deepgram WebSocket")
+                self._dg_socket = socket
 
                 # Start receiving transcription results in a separate thread
                 receive_thread = threading.Thread(
-                    target=self._receive_transcription, args=(socket,), daemon=True
+                    target=self._run_prioritised,
+                    args=(self._receive_transcription, socket),
+                    daemon=True,
                 )
                 receive_thread.start()
 
+                self._send_q.clear()
+                send_thread = threading.Thread(
+                    target=self._run_prioritised,
+                    args=(self._send_worker, socket),
+                    daemon=True,
+                )
+                send_thread.start()
+
+                keepalive_thread = threading.Thread(
+                    target=self._keepalive_worker, args=(socket,), daemon=True
+                )
+                keepalive_thread.start()
+
+                priority_raised = False
+
                 def audio_callback(indata, frames, time_info, status):
+                    # PortAudio owns this thread, so it can only be
+                    # reprioritised from inside the callback
+                    nonlocal priority_raised
+                    if not priority_raised:
+                        priority_raised = True
+                        self._raise_thread_priority()
                     if status:
-                        print(f"DEBUG: Audio status: {status}")
-                    if self.is_listening:
-                        # Send audio to Deepgram using send_media()
-                        audio_bytes = indata.tobytes()
-                        print(f"DEBUG: Sending {len(audio_bytes)} bytes of audio")
-                        socket.send_media(audio_bytes)
+                        _log.debug("Audio status: %s", status)
+                    # The noise floor is tracked while idle too, so it is
+                    # already settled when ALT goes down
+                    voiced = self._is_voiced(audio_dsp.rms(indata[:, 0]))
+                    if not self.is_listening:
+                        return
+                    # Converting copies out of the PortAudio buffer, which
+                    # is reused once the callback returns
+                    block = to_linear16(indata)
+                    if not voiced:
+                        self._preroll.append(block)
+                        return
+                    while self._preroll:
+                        self._send_q.append(self._preroll.popleft())
+                    self._send_q.append(block)
+                    self._audio_ready.set()
 
                 with sd.InputStream(
                     callback=audio_callback,
@@ -525,125 +866,268 @@ class STTIndicator:
                     samplerate=samplerate,
                     dtype="int16",
                     blocksize=int(samplerate * 0.1),  # 100ms chunks
+                    latency="low",
                 ):
                     print("DEBUG: Recording started...")
-                    while self.is_listening:
-                        time.sleep(0.1)
+                    # Set on close, or by the receive thread when the socket drops
+                    self._session_stop.wait()
 
+                self._audio_ready.set()
+                send_thread.join(timeout=1.0)
                 print("DEBUG: Recording stopped")
 
+            if self.running:
+                # The socket dropped; the next session reconnects
+                self._schedule(0, self._stop_listening)
+
         except Exception as e:
             print(f"DEBUG: Error in audio recording/transcription: {e}", flush=True)
             import traceback
 
             traceback.print_exc()
-            self.root.after(0, self._stop_listening)
+            self._schedule(0, self._stop_listening)
+        finally:
+            self._dg_socket = None
+            self.is_recording = False
+            self._session_stop.set()
+            self._audio_ready.set()
+
+    @staticmethod
+    def _raise_thread_priority():
+        """Move the calling thread to SCHED_FIFO, or failing that a lower nice value"""
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))
+            return
+        except (AttributeError, OSError):
+            # Needs CAP_SYS_NICE or an rtprio limit (/etc/security/limits.d)
+            pass
+        try:
+            # On Linux this only affects the calling thread
+            os.nice(-10)
+        except OSError:
+            pass
+
+    def _run_prioritised(self, target, *args):
+        """Thread entry point: raise this thread's priority, then run target"""
+        self._raise_thread_priority()
+        target(*args)
+
+    def _send_worker(self, socket):
+        """Send queued audio blocks to Deepgram"""
+        while not self._session_stop.is_set():
+            self._audio_ready.wait()
+            self._audio_ready.clear()
+            while self._send_q:
+                try:
+                    block = self._send_q.popleft()
+                    if block is None:
+                        socket.send_finalize()
+                    else:
+                        socket.send_media(block)
+                    self._last_send = time.monotonic()
+                except Exception as e:
+                    print(f"DEBUG: Error sending audio: {e}", flush=True)
+
+    def _is_voiced(self, rms):
+        """Gate one block on its energy relative to the running noise floor"""
+        if rms > VAD_RATIO * self._noise_floor:
+            # Creep up during long loud stretches in case the floor itself rose
+            self._noise_floor = 0.995 * self._noise_floor + 0.005 * rms
+            self._hangover = VAD_HANGOVER_BLOCKS
+            return True
+        self._noise_floor = max(VAD_MIN_FLOOR, 0.95 * self._noise_floor + 0.05 * rms)
+        if self._hangover:
+            self._hangover -= 1
+            return True
+        return False
+
+    def _keepalive_worker(self, socket):
+        """Send KeepAlive while idle or in silence so Deepgram keeps the socket open"""
+        while not self._session_stop.wait(KEEPALIVE_INTERVAL_S):
+            if time.monotonic() - self._last_send < KEEPALIVE_INTERVAL_S:
+                continue
+            try:
+                socket.send_keep_alive()
+            except Exception as e:
+                print(f"DEBUG: Error sending KeepAlive: {e}", flush=True)
+                break
 
     def _receive_transcription(self, socket):
         """Receive transcription results in a separate thread"""
         try:
-            print("DEBUG: Starting transcription receive thread")
-            while self.is_listening:
+            _log.debug("Starting transcription receive thread")
+            while not self._session_stop.is_set():
                 try:
                     # Use recv() not receive() - returns event objects, not JSON
                     result = socket.recv()
                     if result:
                         self._on_transcript_event(result)
                 except Exception as e:
-                    # Check for normal closure (code 1000)
-                    if "1000" in str(e):
-                        print("DEBUG: WebSocket closed normally (1000)", flush=True)
+                    # Normal closure: the server sent close code 1000
+                    if isinstance(e, ConnectionClosed) and _close_code(e) == 1000:
+                        _log.info("WebSocket closed normally (1000)")
                     else:
-                        print(f"DEBUG: Error in receive loop: {e}", flush=True)
+                        _log.exception("Error in receive loop: %s", e)
                     break
-                time.sleep(0.01)
-        except Exception as e:
-            print(f"DEBUG: Exception in receive thread: {e}", flush=True)
+        except Exception:
+            _log.exception("Exception in receive thread")
+        finally:
+            # recv() blocks until a message arrives or the socket closes, so
+            # this thread notices the end of the session first
+            self._session_stop.set()
 
     def _on_transcript_event(self, event):
         """Handle incoming transcription event object (already parsed)"""
         try:
-            print(f"DEBUG: Received event from Deepgram: {type(event).__name__}")
-
-            # Check if it's a results event
-            if hasattr(event, "type") and event.type == "Results":
-                # Try different attribute names
-                channel = None
-                if hasattr(event, "channel"):
-                    channel = event.channel
-                elif hasattr(event, "results") and event.results:
-                    # Event might have results structure
-                    results = event.results
-                    if hasattr(results, "channels") and results.channels:
-                        channel = results.channels[0]
-
-                if channel:
-                    alternatives = getattr(channel, "alternatives", [])
-                    if alternatives and len(alternatives) > 0:
-                        alt = alternatives[0]
-                        transcript = getattr(alt, "transcript", "")
-                        if transcript and transcript.strip():
-                            print(f"DEBUG: Transcript: {transcript}", flush=True)
-                            self.root.after(0, self._add_transcription, transcript)
+            _log.debug("Received event from Deepgram: %s", type(event).__name__)
+
+            event_type = getattr(event, "type", None)
+            if event_type == "UtteranceEnd":
+                self._schedule_type_flush()
+                return
+            if event_type != "Results":
+                return
+
+            try:
+                alternatives = self._alternatives(event)
+            except AttributeError:
+                # Not the shape seen so far; switch to the other for good
+                if self._alternatives == self._channel_alternatives:
+                    self._alternatives = self._results_alternatives
+                else:
+                    self._alternatives = self._channel_alternatives
+                alternatives = self._alternatives(event)
+
+            transcript = alternatives[0].transcript if alternatives else ""
+            if not transcript or not transcript.strip():
+                # The result of a Finalize is often empty but still ends the
+                # utterance; no UtteranceEnd follows once audio has stopped
+                if event.speech_final or event.from_finalize:
+                    self._schedule_type_flush()
+                return
+
+            _log.debug("Transcript: %s", transcript)
+
+            if event.is_final or event.speech_final:
+                # A Finalize (sent on ALT release) also ends the utterance
+                self._queue_final(
+                    transcript, event.speech_final or event.from_finalize
+                )
+            else:
+                # Interim hypotheses are never typed, only
+                # previewed on the indicator
+                self._interim_text = transcript
+                self._schedule(0, self._show_preview)
         except Exception as e:
             print(f"DEBUG: Error in _on_transcript_event: {e}", flush=True)
 
+    @staticmethod
+    def _channel_alternatives(event):
+        """Alternatives of a Results event with a top-level channel"""
+        return event.channel.alternatives
+
+    @staticmethod
+    def _results_alternatives(event):
+        """Alternatives of a Results event nested under results.channels"""
+        return event.results.channels[0].alternatives
+
+    def _queue_final(self, transcript, utterance_end):
+        """Collect a final transcript; each utterance is typed as one"""
+        with self._pending_lock:
+            self._pending_type.append(transcript)
+        if utterance_end:
+            self._schedule_type_flush()
+
+    def _schedule_type_flush(self):
+        """Type the collected finals on the Tk thread"""
+        with self._pending_lock:
+            if self._type_flush_scheduled or not self._pending_type:
+                return
+            self._type_flush_scheduled = True
+        self._schedule(0, self._flush_pending_type)
+
+    def _flush_pending_type(self):
+        """Process the finals of the utterance that just ended"""
+        with self._pending_lock:
+            pending, self._pending_type = self._pending_type, []
+            self._type_flush_scheduled = False
+        self._interim_text = ""
+        self._show_preview()
+        if pending:
+            # Process transcript for mixed content (text + commands)
+            self._process_transcript(" ".join(pending))
+
+    def _show_preview(self):
+        """Show the tail of the current interim hypothesis under the indicator"""
+        if self.is_listening:
+            self.status_label.config(text=self._interim_text[-20:] or "Listening")
+
     def _add_transcription(self, text):
-        """Add transcription to output window AND type into active window"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_text = f"[{timestamp}] {text}\n"
+        """Add transcription to output window and transcript file"""
+        formatted_text = self._line_fmt(datetime.now(), text)
 
         print(formatted_text, end="", flush=True)
 
-        # Type into any active window/application
-        self._type_into_active_window(text)
-
         if self.text_area and self.text_area.winfo_exists():
             self.text_area.insert(tk.END, formatted_text)
+            line_count = int(self.text_area.index("end-1c").split(".")[0])
+            if line_count > MAX_OUTPUT_LINES:
+                self.text_area.delete("1.0", f"{line_count - MAX_OUTPUT_LINES}.0")
             self.text_area.see(tk.END)
 
         # Auto-save to file
-        try:
-            with open("transcriptions.txt", "a", encoding="utf-8") as f:
-                f.write(formatted_text)
-        except Exception as e:
-            print(f"DEBUG: Error saving to file: {e}", flush=True)
+        self._log_q.put(formatted_text)
+
+    def _log_worker(self):
+        """Append queued transcript lines, writing each backlog in one batch"""
+        log_file = None
+        done = False
+        while not done:
+            lines = [self._log_q.get()]
+            while True:
+                try:
+                    lines.append(self._log_q.get_nowait())
+                except queue.Empty:
+                    break
+            if None in lines:
+                done = True
+                lines = lines[: lines.index(None)]
+            if not lines:
+                continue
+            try:
+                if log_file is None:
+                    log_file = open("transcriptions.txt", "a", encoding="utf-8")
+                log_file.writelines(lines)
+                log_file.flush()
+            except Exception as e:
+                print(f"DEBUG: Error saving to file: {e}", flush=True)
+        if log_file is not None:
+            log_file.close()
 
     def _type_into_active_window(self, text):
-        """Type transcription into currently active window using xdotool"""
-        if not self.xdotool_available:
+        """Queue transcription for typing into the currently active window"""
+        if not (self._xdo or self.ydotool_available or self.xdotool_available):
             print("DEBUG: ERROR - xdotool not available, cannot type!", flush=True)
             print("DEBUG: Install xdotool: sudo apt install xdotool", flush=True)
             return
 
-        try:
-            # Add space after text for natural typing
-            text_to_type = text + " "
-
-            print(
-                f"DEBUG: Typing into active window: '{text_to_type.strip()}'",
-                flush=True,
-            )
-
-            success = self._type_with_xdotool(text_to_type)
-
-            if success:
-                print(f"DEBUG: Successfully typed: {text}", flush=True)
-            else:
-                print(f"DEBUG: Failed to type: {text}", flush=True)
-                print(f"DEBUG: Make sure you clicked into a text box!", flush=True)
+        # Add space after text for natural typing
+        text_to_type = text + " "
 
-        except Exception as e:
-            print(f"DEBUG: Error typing into window: {e}", flush=True)
-            print(
-                f"DEBUG: Make sure you clicked into a text box before transcribing!",
-                flush=True,
-            )
+        print(
+            f"DEBUG: Typing into active window: '{text_to_type.strip()}'",
+            flush=True,
+        )
+        self._type_q.put(("text", text_to_type))
 
     def _on_closing(self):
         """Handle window closing"""
         self._stop_listening()
         self.running = False
+        self._session_stop.set()
+        self._log_q.put(None)
+        self._log_thread.join(timeout=2.0)
+        self.root.tk.deletefilehandler(self._wake_r)
         self.root.destroy()
 
     def run(self):
@@ -683,55 +1167,53 @@ class STTIndicator:
         )
         self.keyboard_listener.start()
 
+        # Connect up front (once _async_init is done) so the first ALT press
+        # doesn't wait on the TLS and WebSocket handshake
+        self._ensure_connected()
+
         self.root.mainloop()
 
     def _on_key_press(self, key):
-        """Handle key press events"""
+        """Handle key press events (keyboard listener thread; must return fast)"""
         # Skip processing if we're currently typing
-        if self.is_typing:
-            return
-
-        print(f"DEBUG: Key pressed: {key}", flush=True)
-
-        if key == keyboard.Key.alt:
-            print("DEBUG: ALT key detected!", flush=True)
-            if not self.is_listening:
-                print("=== HOLD ALT TO START TRANSCRIBING ===", flush=True)
-                # Immediate start - no delay
-                self._start_listening()
-                print(
-                    "=== SPEAK NOW - Words will type where your cursor is ===",
-                    flush=True,
-                )
-            else:
-                print("ALT key pressed but already listening", flush=True)
-        elif hasattr(key, "value") and hasattr(key, "name"):
-            # Handle Ctrl+Space (Space when Ctrl is held)
-            print(f"DEBUG: Checking for Ctrl+Space: {key}", flush=True)
-        else:
-            print(f"Other key pressed: {key}", flush=True)
+        if key is keyboard.Key.alt and not self.is_typing:
+            self._post_event("press")
 
     def _on_key_release(self, key):
-        """Handle key release events"""
-        # Skip processing if we're currently typing
-        if self.is_typing:
-            return
+        """Handle key release events (keyboard listener thread; must return fast)"""
+        if key is keyboard.Key.alt and not self.is_typing:
+            self._post_event("release")
 
-        print(f"Key released: {key}", flush=True)
-        if key == keyboard.Key.alt and self.is_listening:
-            # Stop listening when ALT is released (press-and-hold mode)
-            print("=== RELEASED ALT - STOPPED LISTENING ===", flush=True)
-            self._stop_listening()
-            print("=== Click into a text box, then HOLD ALT and speak ===", flush=True)
+    def _post_event(self, event):
+        """Queue an ALT event and wake the Tk thread (listener thread)"""
+        self._evq.put_nowait(event)
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass  # pipe full: a wake-up is already pending
 
-    def _on_key_release(self, key):
-        """Handle key release events"""
-        print(f"Key released: {key}", flush=True)
-        if key == keyboard.Key.alt and self.is_listening:
-            # Stop listening when ALT is released (press-and-hold mode)
-            print("=== RELEASED ALT - STOPPED LISTENING ===", flush=True)
-            self.root.after(100, self._stop_listening)
-            print("=== Click into a text box, then HOLD ALT and speak ===", flush=True)
+    def _drain_events(self, *_):
+        """Act on queued ALT presses and releases on the Tk thread"""
+        try:
+            # Wake-up bytes are read before the queue is emptied, so an
+            # event posted meanwhile leaves a byte behind and drains next
+            while os.read(self._wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        try:
+            while True:
+                event = self._evq.get_nowait()
+                if event == "press" and not self.is_listening:
+                    print("=== HOLD ALT TO START TRANSCRIBING ===", flush=True)
+                    # Immediate start - no delay
+                    self._start_listening()
+                elif event == "release" and self.is_listening:
+                    # Stop listening when ALT is released (press-and-hold mode)
+                    print("=== RELEASED ALT - STOPPED LISTENING ===", flush=True)
+                    self._schedule(100, self._stop_listening)
+        except queue.Empty:
+            pass
 
 
 if __name__ == "__main__":
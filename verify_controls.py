@@ -1,46 +1,23 @@
 import unittest
-from unittest.mock import MagicMock, patch
-import sys
-import os
 
-# Add current directory to path
-sys.path.append(os.getcwd())
-
-from deepgram_stt_v5 import STTIndicator
+from deepgram_stt_v5 import _Cmd, _parse_transcript
 
 
 class TestVoiceCommands(unittest.TestCase):
     def test_enter_command(self):
-        with (
-            patch("tkinter.Tk"),
-            patch("pynput.keyboard.Listener"),
-            patch("subprocess.run") as mock_run,
-        ):
-            app = STTIndicator()
-
-            # Test "Enter"
-            result = app._process_voice_commands("Enter")
-            self.assertTrue(result)
-            mock_run.assert_called_with(["xdotool", "key", "Return"], check=True)
-
-            # Test "Enter."
-            mock_run.reset_mock()
-            result = app._process_voice_commands("Enter.")
-            self.assertTrue(result)
-            mock_run.assert_called_with(["xdotool", "key", "Return"], check=True)
+        enter = [_Cmd("enter", 1)]
 
-            # Test "enter" (lowercase)
-            mock_run.reset_mock()
-            result = app._process_voice_commands("enter")
-            self.assertTrue(result)
-            mock_run.assert_called_with(["xdotool", "key", "Return"], check=True)
+        # Test "Enter"
+        self.assertEqual(_parse_transcript("Enter"), enter)
 
-            # Test "Enter something else" (should fail)
-            mock_run.reset_mock()
-            result = app._process_voice_commands("Enter something else")
-            self.assertFalse(result)
-            mock_run.assert_not_called()
+        # Test "Enter."
+        self.assertEqual(_parse_transcript("Enter."), enter)
 
+        # Test "enter" (lowercase)
+        self.assertEqual(_parse_transcript("enter"), enter)
 
-if __name__ == "__main__":
-    unittest.main()
+        # Test "Enter something else" (not a command, typed as text)
+        self.assertEqual(
+            _parse_transcript("Enter something else"),
+            [_Cmd("text", "Enter something else")],
+        )
@@ -1,10 +1,7 @@
 import unittest
 from unittest.mock import MagicMock, patch
-import sys
-import os
-
-# Add current directory to path so we can import the module
-sys.path.append(os.getcwd())
+from websockets.exceptions import ConnectionClosed
+from websockets.frames import Close
 
 from deepgram_stt_v5 import STTIndicator
 
@@ -18,30 +15,15 @@ class TestSTTFix(unittest.TestCase):
 
             # Mock the socket
             mock_socket = MagicMock()
-            # First call returns None (to skip processing), second raises Exception with "1000"
-            mock_socket.recv.side_effect = [
-                Exception("WebSocket connection closed: 1000")
-            ]
-
-            # Capture stdout
-            from io import StringIO
-
-            captured_output = StringIO()
-            sys.stdout = captured_output
-
-            # Run the method
-            app._receive_transcription(mock_socket)
+            # recv() raises the websockets close exception with code 1000
+            mock_socket.recv.side_effect = [ConnectionClosed(Close(1000, ""), None)]
 
-            # Reset stdout
-            sys.stdout = sys.__stdout__
-
-            output = captured_output.getvalue()
-            print(f"Captured output: {output}")
+            # Run the method, capturing the module's log records
+            with self.assertLogs("deepgram_stt", level="INFO") as cm:
+                app._receive_transcription(mock_socket)
 
             # Verify we see the "normal closure" message and NOT "Error in receive loop"
-            self.assertIn("WebSocket closed normally (1000)", output)
-            self.assertNotIn("Error in receive loop", output)
-
-
-if __name__ == "__main__":
-    unittest.main()
+            self.assertTrue(
+                any("WebSocket closed normally (1000)" in r for r in cm.output)
+            )
+            self.assertFalse(any("Error in receive loop" in r for r in cm.output))
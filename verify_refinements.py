@@ -1,190 +1,289 @@
+import contextlib
+import queue
 import unittest
-from unittest.mock import MagicMock, patch, call
-import sys
-import os
+from unittest.mock import DEFAULT, MagicMock, patch, call
 from pynput import keyboard
 
-# Add current directory to path
-sys.path.append(os.getcwd())
+from deepgram_stt_v5 import _XDOTOOL_ENTER_ARGV, STTIndicator
 
-from deepgram_stt_v5 import STTIndicator
 
+class Recorder(list):
+    """Callable stub that records its argument, without Mock's bookkeeping"""
 
-class TestRefinedVoiceCommands(unittest.TestCase):
-    def test_explicit_commands(self):
-        with (
-            patch("tkinter.Tk"),
-            patch("pynput.keyboard.Listener"),
-            patch("subprocess.run") as mock_run,
-        ):
-            app = STTIndicator()
-            app._add_transcription = MagicMock()
-            # Reset mock to ignore calls made during init (like checking xdotool)
-            mock_run.reset_mock()
-
-            commands = ["Type Enter", "Press Enter", "New Line", "Next Line"]
-            for cmd in commands:
-                mock_run.reset_mock()
-                app._add_transcription.reset_mock()
-                app._process_transcript(cmd)
+    __call__ = list.append
 
-                # Should NOT type text
-                app._add_transcription.assert_not_called()
-                # Should execute command
-                mock_run.assert_called_with(["xdotool", "key", "Return"], check=True)
-
-    def test_repeated_enter(self):
-        with (
-            patch("tkinter.Tk"),
-            patch("pynput.keyboard.Listener"),
-            patch("subprocess.run") as mock_run,
-        ):
-            app = STTIndicator()
-            app._add_transcription = MagicMock()
-            mock_run.reset_mock()
 
-            # Test "Enter. Enter."
-            app._process_transcript("Enter. Enter.")
-            app._add_transcription.assert_not_called()
-            self.assertEqual(mock_run.call_count, 2)
-            mock_run.assert_has_calls(
-                [call(["xdotool", "key", "Return"], check=True)] * 2
+class TestRefinedVoiceCommands(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # One app shared by every test. Process launches go through
+        # STTIndicator._run and key commands through _xdotool_cmd; stub
+        # both, plus the display and keyboard hook.
+        cls._ctx = contextlib.ExitStack()
+        cls._ctx.enter_context(patch("tkinter.Tk"))
+        cls._ctx.enter_context(patch("pynput.keyboard.Listener"))
+        cls._ctx.enter_context(patch("shutil.which", return_value=None))
+        # The tool lookups are cached per process, so an earlier module may
+        # already have probed the host; pin them to "xdotool only"
+        cls._ctx.enter_context(
+            patch.multiple(
+                "deepgram_stt_v5",
+                _have_xdotool=MagicMock(return_value=False),
+                _have_ydotool=MagicMock(return_value=False),
             )
-
-            # Test "Enter enter enter"
-            mock_run.reset_mock()
-            app._process_transcript("Enter enter enter")
-            app._add_transcription.assert_not_called()
-            self.assertEqual(mock_run.call_count, 3)
-
-    def test_mixed_content_repro(self):
-        with (
-            patch("tkinter.Tk"),
-            patch("pynput.keyboard.Listener"),
-            patch("subprocess.run") as mock_run,
+        )
+        mocks = cls._ctx.enter_context(
+            patch.multiple(STTIndicator, _run=DEFAULT, _xdotool_cmd=DEFAULT)
+        )
+        cls.mock_run = mocks["_run"]
+        cls.mock_cmd = mocks["_xdotool_cmd"]
+        cls.app = STTIndicator()
+        cls.app._xdo = None
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._ctx.close()
+
+    def setUp(self):
+        # Drop the previous test's stubs and state from the shared app
+        app = self.app
+        for name in (
+            "_process_transcript",
+            "_start_listening",
+            "_stop_listening",
+            "_toggle_listening",
         ):
-            app = STTIndicator()
-            app._add_transcription = MagicMock()
-            mock_run.reset_mock()
+            app.__dict__.pop(name, None)
+        app.is_listening = False
+        app.is_typing = False
+        app._pending_type.clear()
+        app._type_flush_scheduled = False
+        app._schedule = MagicMock()
+        app.xdotool_available = True
+        self.mock_run.reset_mock()
+        self.mock_cmd.reset_mock()
+
+        # Record every typing job as it is queued
+        self.jobs = Recorder()
+
+        def put(job):
+            self.jobs(job)
+            queue.Queue.put(app._type_q, job)
+
+        app._type_q.put = put
+
+    def assert_no_text(self):
+        """Nothing was shown or queued for typing"""
+        self.app._schedule.assert_not_called()
+        self.assertFalse([job for job in self.jobs if job[0] == "text"])
 
-            # User input: "Test. Test. Test one two. Test. Test one two. Enter. Enter. Enter. Enter. Enter. Enter. Enter. Enter. Still not hitting anything."
-            transcript = "Test. Test. Test one two. Test. Test one two. Enter. Enter. Enter. Enter. Enter. Enter. Enter. Enter. Still not hitting anything."
+    def test_explicit_commands(self):
+        mock_run = self.mock_run
+        app = self.app
 
-            app._process_transcript(transcript)
+        commands = ["Type Enter", "Press Enter", "New Line", "Next Line"]
+        for cmd in commands:
+            mock_run.reset_mock()
+            self.jobs.clear()
+            app._process_transcript(cmd)
+            app._type_q.join()
 
-            # Should schedule typing of the text part
-            # With split logic:
-            # "Test. Test. Test one two. Test. Test one two." -> Typed
-            # "Enter." x8 -> Executed
-            # " Still not hitting anything." -> Typed
+            # Should NOT type text
+            self.assert_no_text()
+            # Should execute command
+            mock_run.assert_called_once_with(_XDOTOOL_ENTER_ARGV, check=True)
 
-            # Verify calls to _add_transcription
-            # Note: The exact buffering might result in multiple calls or combined calls depending on logic.
-            # Our logic flushes buffer before command.
+    def test_repeated_enter(self):
+        mock_cmd = self.mock_cmd
+        app = self.app
+
+        # Test "Enter. Enter."
+        app._process_transcript("Enter. Enter.")
+        app._type_q.join()
+        self.assert_no_text()
+        mock_cmd.assert_called_once_with(
+            "key --clearmodifiers --repeat 2 --delay 0 Return"
+        )
+
+        # Test "Enter enter enter"
+        mock_cmd.reset_mock()
+        app._process_transcript("Enter enter enter")
+        app._type_q.join()
+        self.assert_no_text()
+        mock_cmd.assert_called_once_with(
+            "key --clearmodifiers --repeat 3 --delay 0 Return"
+        )
 
-            # 1. "Test... one two."
-            app.root.after.assert_any_call(
-                0,
-                app._add_transcription,
+    def test_mixed_content_repro(self):
+        mock_cmd = self.mock_cmd
+        app = self.app
+        # User input: "Test. Test. Test one two. Test. Test one two. Enter. Enter. Enter. Enter. Enter. Enter. Enter. Enter. Still not hitting anything."
+        transcript = "Test. Test. Test one two. Test. Test one two. Enter. Enter. Enter. Enter. Enter. Enter. Enter. Enter. Still not hitting anything."
+
+        app._process_transcript(transcript)
+
+        app._type_q.join()
+
+        # Should schedule typing of the text part
+        # With split logic:
+        # "Test. Test. Test one two. Test. Test one two." -> Typed
+        # "Enter." x8 -> Executed
+        # " Still not hitting anything." -> Typed
+
+        # Both text parts are shown by one scheduled callback
+        app._schedule.assert_called_once_with(
+            0,
+            app._add_many,
+            [
                 "Test. Test. Test one two. Test. Test one two.",
-            )
+                " Still not hitting anything.",
+            ],
+        )
 
-            # 2. " Still not hitting anything."
-            app.root.after.assert_any_call(
-                0, app._add_transcription, " Still not hitting anything."
-            )
-
-            # Should execute 8 Enters
-            self.assertEqual(mock_run.call_count, 8)
+        # Should execute 8 Enters, as one run
+        mock_cmd.assert_called_once_with(
+            "key --clearmodifiers --repeat 8 --delay 0 Return"
+        )
 
     def test_mixed_content_simple(self):
-        with (
-            patch("tkinter.Tk"),
-            patch("pynput.keyboard.Listener"),
-            patch("subprocess.run") as mock_run,
-        ):
-            app = STTIndicator()
-            app._add_transcription = MagicMock()
-            mock_run.reset_mock()
-
-            app._process_transcript("Test. Enter.")
+        mock_cmd = self.mock_cmd
+        app = self.app
 
-            app.root.after.assert_called_with(0, app._add_transcription, "Test.")
-            mock_run.assert_called_once_with(["xdotool", "key", "Return"], check=True)
+        app._process_transcript("Test. Enter.")
 
-    def test_alt_key_toggle(self):
-        """Test that Alt key toggles listening"""
-        with (
-            patch("tkinter.Tk"),
-            patch("pynput.keyboard.Listener"),
-            patch("subprocess.run") as mock_run,
-        ):
-            app = STTIndicator()
-            app.is_listening = False
-            app._start_listening = MagicMock()
-            app._stop_listening = MagicMock()
+        app._type_q.join()
 
-            # 1. Press Alt -> Start Listening
-            app._on_key_press(keyboard.Key.alt)
-            app.root.after.assert_called_with(100, app._start_listening)
+        app._schedule.assert_called_once_with(0, app._add_many, ["Test."])
+        self.mock_run.assert_called_with(_XDOTOOL_ENTER_ARGV, check=True)
+        mock_cmd.assert_not_called()
 
-            # 2. Release Alt -> Should NOT stop listening (Toggle mode)
-            app._on_key_release(keyboard.Key.alt)
-            app._stop_listening.assert_not_called()
+    def test_text_typed_before_enter(self):
+        """Text is typed through xdotool before the Enter that follows it"""
+        app = self.app
+        order = []
+        self.mock_run.side_effect = lambda args, **kw: order.append(args)
+        self.mock_cmd.side_effect = order.append
+        self.addCleanup(setattr, self.mock_run, "side_effect", None)
+        self.addCleanup(setattr, self.mock_cmd, "side_effect", None)
 
-            # Simulate listening started
-            app.is_listening = True
+        app._process_transcript("Test. Enter.")
+        app._type_q.join()
 
-            # 3. Press Alt again -> Stop Listening
-            app._on_key_press(keyboard.Key.alt)
-            # Use ANY because the bound method instance might differ
-            from unittest.mock import ANY
+        self.assertEqual(
+            order,
+            [
+                ["xdotool", "type", "--clearmodifiers", "--delay", "10", "Test. "],
+                _XDOTOOL_ENTER_ARGV,
+            ],
+        )
 
-            app.root.after.assert_called_with(100, ANY)
+    def test_alt_key_toggle(self):
+        """Test that holding Alt listens and releasing it stops"""
+        app = self.app
+        app.is_listening = False
+        app._start_listening = MagicMock()
+        app._stop_listening = MagicMock()
+
+        # 1. Press Alt -> Start Listening once the Tk thread drains it
+        app._on_key_press(keyboard.Key.alt)
+        app._start_listening.assert_not_called()
+        app._drain_events()
+        app._start_listening.assert_called_once()
+
+        # Simulate listening started
+        app.is_listening = True
+
+        # 2. Press Alt again (auto-repeat) -> no second start
+        app._on_key_press(keyboard.Key.alt)
+        app._drain_events()
+        app._start_listening.assert_called_once()
+
+        # 3. Release Alt -> Stop Listening (press-and-hold mode)
+        app._on_key_release(keyboard.Key.alt)
+        app._drain_events()
+        app._schedule.assert_any_call(100, app._stop_listening)
 
     def test_alt_key_interference_ignored(self):
         """Test that typing flag prevents Alt key press/release from interfering"""
-        with (
-            patch("tkinter.Tk"),
-            patch("pynput.keyboard.Listener"),
-            patch("subprocess.run") as mock_run,
-        ):
-            app = STTIndicator()
-            app.is_listening = True
-            app._stop_listening = MagicMock()
-            app._toggle_listening = MagicMock()
+        app = self.app
+        app.is_listening = True
+        app._stop_listening = MagicMock()
+        app._toggle_listening = MagicMock()
 
-            # Simulate typing active
-            app.is_typing = True
+        # Simulate typing active
+        app.is_typing = True
 
-            # Press Alt -> Should be ignored
-            app._on_key_press(keyboard.Key.alt)
-            app._toggle_listening.assert_not_called()
+        # Press Alt -> Should be ignored
+        app._on_key_press(keyboard.Key.alt)
+        app._toggle_listening.assert_not_called()
 
-            # Release Alt -> Should be ignored (no state change)
-            app._on_key_release(keyboard.Key.alt)
-            app._stop_listening.assert_not_called()
+        # Release Alt -> Should be ignored (no state change)
+        app._on_key_release(keyboard.Key.alt)
+        app._stop_listening.assert_not_called()
 
     def test_enters_command(self):
         """Test the new 'enters' command"""
-        with (
-            patch("tkinter.Tk"),
-            patch("pynput.keyboard.Listener"),
-            patch("subprocess.run") as mock_run,
-        ):
-            app = STTIndicator()
-            app._add_transcription = MagicMock()
-            mock_run.reset_mock()
-
-            # "Enters"
-            app._process_transcript("Enters")
-            mock_run.assert_called_with(["xdotool", "key", "Return"], check=True)
-
-            mock_run.reset_mock()
-            # "Enter key"
-            app._process_transcript("Enter key")
-            mock_run.assert_called_with(["xdotool", "key", "Return"], check=True)
-
+        mock_run = self.mock_run
+        app = self.app
+
+        # "Enters"
+        app._process_transcript("Enters")
+        app._type_q.join()
+        mock_run.assert_called_once_with(_XDOTOOL_ENTER_ARGV, check=True)
+
+        mock_run.reset_mock()
+        # "Enter key"
+        app._process_transcript("Enter key")
+        app._type_q.join()
+        mock_run.assert_called_once_with(_XDOTOOL_ENTER_ARGV, check=True)
+
+        mock_run.reset_mock()
+        # No space after the punctuation: "Hello." is typed, then Enter
+        app._process_transcript("Hello.Enter.")
+        app._type_q.join()
+        mock_run.assert_called_with(_XDOTOOL_ENTER_ARGV, check=True)
+
+
+    def test_finals_coalesced_and_interims_not_typed(self):
+        """Finals of one utterance are processed as one transcript"""
+        app = self.app
+        app._process_transcript = MagicMock()
+        app._schedule.reset_mock()
+
+        def event(text, is_final, speech_final=False, from_finalize=False):
+            alt = MagicMock(transcript=text)
+            return MagicMock(
+                type="Results",
+                channel=MagicMock(alternatives=[alt]),
+                is_final=is_final,
+                speech_final=speech_final,
+                from_finalize=from_finalize,
+            )
 
-if __name__ == "__main__":
-    unittest.main()
+        app._on_transcript_event(event("Hello", False))
+        app._on_transcript_event(event("Hello world.", True))
+        app._on_transcript_event(event("Enter.", True, speech_final=True))
+
+        # Interim is only previewed; the utterance end schedules one flush
+        app._process_transcript.assert_not_called()
+        app._schedule.assert_has_calls(
+            [call(0, app._show_preview), call(0, app._flush_pending_type)]
+        )
+        self.assertEqual(app._schedule.call_count, 2)
+
+        app._flush_pending_type()
+        app._process_transcript.assert_called_once_with("Hello world. Enter.")
+
+        # Without speech_final, UtteranceEnd closes the utterance
+        app._schedule.reset_mock()
+        app._on_transcript_event(event("Next.", True))
+        app._schedule.assert_not_called()
+        app._on_transcript_event(MagicMock(type="UtteranceEnd"))
+        app._schedule.assert_called_once_with(0, app._flush_pending_type)
+
+        # An empty result from the Finalize sent on ALT release ends it too
+        app._flush_pending_type()
+        app._schedule.reset_mock()
+        app._on_transcript_event(event("Last.", True))
+        app._on_transcript_event(event("", True, from_finalize=True))
+        app._schedule.assert_called_once_with(0, app._flush_pending_type)